@@ -8,11 +8,19 @@ features of the C implementation are currently ported.
 """
 from __future__ import annotations
 
+import array
 import json
 import os
 import struct
+import threading
 from dataclasses import dataclass, field
 
+import cairo
+import numpy as np
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the NumPy code path is used instead
+    njit = None
 import usb.core
 import usb.util
 import gi
@@ -51,23 +59,36 @@ SCREEN_VAL_SCOPE = 0x00
 SCREEN_VAL_DMM = 0x01
 SCREEN_VAL_AWG = 0x02
 
+# Capture transfers
+CAPTURE_CHUNK = 4096         # bytes requested per bulk read
+CAPTURE_TIMEOUT_MS = 2000    # base timeout for a bulk read
+
 # Configuration storage
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config", "Hantek2D72")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "Hantek.cfg")
+CONFIG_SAVE_DELAY_MS = 500
 
 # ---------------------------------------------------------------------------
 # Data structures
 # ---------------------------------------------------------------------------
-@dataclass
+# 10-byte command frame: 0x00, length, func, cmd, 4 values, 0x00
+_PACKER = struct.Struct("<BBHBBBBBB")
+_HEADER = struct.Struct("<BBHB")
+
+
+@dataclass(slots=True)
 class HantekCommand:
     func: int
     cmd: int
-    vals: list[int] = field(default_factory=lambda: [0, 0, 0, 0])
+    # Four value bytes, either as ints or already packed
+    vals: tuple[int, ...] | bytes = (0, 0, 0, 0)
 
     def to_bytes(self) -> bytes:
         """Return command in the 10-byte format used on the USB wire."""
-        return struct.pack(
-            "<BBHBBBBBB",
+        if isinstance(self.vals, (bytes, bytearray)):
+            return (_HEADER.pack(0x00, 0x0A, self.func, self.cmd)
+                    + self.vals + b"\x00")
+        return _PACKER.pack(
             0x00,
             0x0A,
             self.func,
@@ -77,11 +98,30 @@ class HantekCommand:
         )
 
 
+# Pre-encoded frames for commands whose values never change
+AWG_START_ON = HantekCommand(FUNC_AWG_SETTING, AWG_START, (1, 0, 0, 0)).to_bytes()
+AWG_START_OFF = HantekCommand(FUNC_AWG_SETTING, AWG_START, (0, 0, 0, 0)).to_bytes()
+CH1_ENABLE = {
+    True: HantekCommand(FUNC_SCOPE_SETTING, SCOPE_ENABLE_CH1, (1, 0, 0, 0)).to_bytes(),
+    False: HantekCommand(FUNC_SCOPE_SETTING, SCOPE_ENABLE_CH1, (0, 0, 0, 0)).to_bytes(),
+}
+CH2_ENABLE = {
+    True: HantekCommand(FUNC_SCOPE_SETTING, SCOPE_ENABLE_CH2, (1, 0, 0, 0)).to_bytes(),
+    False: HantekCommand(FUNC_SCOPE_SETTING, SCOPE_ENABLE_CH2, (0, 0, 0, 0)).to_bytes(),
+}
+SCREEN_SETTING = {
+    val: HantekCommand(FUNC_SCREEN_SETTING, 0, (val, 0, 0, 0)).to_bytes()
+    for val in (SCREEN_VAL_SCOPE, SCREEN_VAL_DMM, SCREEN_VAL_AWG)
+}
+# An empty capture request returns the instrument to its live display
+CAPTURE_RESUME = HantekCommand(FUNC_SCOPE_CAPTURE, SCOPE_START_RECV).to_bytes()
+
+
 def _default_list(v, n):
     return [v for _ in range(n)]
 
 
-@dataclass
+@dataclass(slots=True)
 class Config:
     channel_enable: list[bool] = field(default_factory=lambda: _default_list(True, 2))
     time_scale: int = 0
@@ -94,19 +134,103 @@ class Config:
     num_samples: int = 1200
 
 
+# Binary layout of the configuration file: a format version byte followed by
+# the Config fields in declaration order.
+CONFIG_VERSION = 1
+_CONFIG_STRUCT = struct.Struct("<B??ididdddi")
+
+# Last configuration written to disk and the GLib timeout source of a
+# pending write.  Widget callbacks only schedule a save so that dragging a
+# spin button results in a single write once the value settles.
+_saved_config: bytes | None = None
+_save_source_id: int | None = None
+
+
+def _pack_config(cfg: Config) -> bytes:
+    return _CONFIG_STRUCT.pack(
+        CONFIG_VERSION,
+        *cfg.channel_enable,
+        cfg.time_scale,
+        cfg.time_offset,
+        cfg.trigger_source,
+        cfg.trigger_level,
+        cfg.awg_frequency,
+        cfg.awg_amplitude,
+        cfg.awg_offset,
+        cfg.num_samples,
+    )
+
+
+def _config_from_json(data: bytes) -> Config:
+    """Convert a configuration written in the old JSON format."""
+    cfg = Config(**json.loads(data))
+    # The JSON file accepted any value; coerce to the types of the layout
+    enable = [bool(v) for v in cfg.channel_enable][:2]
+    cfg.channel_enable = enable + [True] * (2 - len(enable))
+    cfg.time_scale = int(cfg.time_scale)
+    cfg.time_offset = float(cfg.time_offset)
+    cfg.trigger_source = int(cfg.trigger_source)
+    cfg.trigger_level = float(cfg.trigger_level)
+    cfg.awg_frequency = float(cfg.awg_frequency)
+    cfg.awg_amplitude = float(cfg.awg_amplitude)
+    cfg.awg_offset = float(cfg.awg_offset)
+    cfg.num_samples = int(cfg.num_samples)
+    _pack_config(cfg)  # raises struct.error for out-of-range values
+    return cfg
+
+
 def load_config() -> Config:
+    global _saved_config
     if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf8") as fh:
-            return Config(**json.load(fh))
-    cfg = Config()
+        with open(CONFIG_FILE, "rb") as fh:
+            data = fh.read()
+        if len(data) == _CONFIG_STRUCT.size and data[0] == CONFIG_VERSION:
+            (_, en1, en2, time_scale, time_offset, trigger_source,
+             trigger_level, awg_frequency, awg_amplitude, awg_offset,
+             num_samples) = _CONFIG_STRUCT.unpack(data)
+            _saved_config = data
+            return Config([en1, en2], time_scale, time_offset,
+                          trigger_source, trigger_level, awg_frequency,
+                          awg_amplitude, awg_offset, num_samples)
+        # Configs written by older versions are JSON; convert them once.
+        # Anything else (e.g. a truncated write) falls back to defaults.
+        try:
+            cfg = _config_from_json(data)
+        except (ValueError, TypeError, struct.error):
+            cfg = Config()
+    else:
+        cfg = Config()
     save_config(cfg)
     return cfg
 
 
 def save_config(cfg: Config) -> None:
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    with open(CONFIG_FILE, "w", encoding="utf8") as fh:
-        json.dump(cfg.__dict__, fh, indent=2)
+    global _saved_config
+    data = _pack_config(cfg)
+    if data == _saved_config:
+        return
+    try:
+        fh = open(CONFIG_FILE, "wb")
+    except FileNotFoundError:
+        # Only the very first save needs to create the directory
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        fh = open(CONFIG_FILE, "wb")
+    with fh:
+        fh.write(data)
+    _saved_config = data
+
+
+def schedule_save_config() -> None:
+    global _save_source_id
+    if _save_source_id is None:
+        _save_source_id = GLib.timeout_add(CONFIG_SAVE_DELAY_MS, _flush_config)
+
+
+def _flush_config() -> bool:
+    global _save_source_id
+    _save_source_id = None
+    save_config(cur_config)
+    return False
 # ---------------------------------------------------------------------------
 # USB helpers
 # ---------------------------------------------------------------------------
@@ -132,8 +256,107 @@ def release_interfaces(dev: usb.core.Device) -> None:
             usb.util.release_interface(dev, intf.bInterfaceNumber)
 
 
+# Frame buffer reused by send_command.  PyUSB passes an array.array to
+# libusb without copying it.  Its only caller is the capture thread, of
+# which at most one runs at a time.
+_send_scratch = array.array("B", bytes(_PACKER.size))
+
+
 def send_command(dev: usb.core.Device, cmd: HantekCommand) -> None:
-    dev.write(0x02, cmd.to_bytes())
+    if isinstance(cmd.vals, (bytes, bytearray)):
+        _HEADER.pack_into(_send_scratch, 0, 0x00, 0x0A, cmd.func, cmd.cmd)
+        memoryview(_send_scratch)[5:9] = cmd.vals
+    else:
+        _PACKER.pack_into(_send_scratch, 0, 0x00, 0x0A, cmd.func, cmd.cmd,
+                          *cmd.vals, 0x00)
+    dev.write(0x02, _send_scratch)
+
+
+# Commands issued from UI handlers are queued and written together in a
+# single bulk transfer from the main loop.  Only the latest frame for each
+# (func, cmd) pair is kept; a replaced frame moves to the end of the batch
+# so the device still sees settings in the order they were last changed.
+_pending_frames: dict[tuple[int, int], bytes] = {}
+# Frames per bulk write, chosen so no frame straddles a 64-byte packet
+FRAMES_PER_WRITE = 64 // _PACKER.size
+_pending_idle_id: int | None = None
+_pending_timeout_id: int | None = None
+
+# Last frame written for each (func, cmd).  Settings whose value truncates
+# to what the device already has are not sent again.
+_last_sent: dict[tuple[int, int], bytes] = {}
+
+# Spin buttons emit value-changed continuously while being dragged.  Their
+# commands are held for SPIN_SEND_DELAY_MS instead, limiting the device to
+# ~20 updates/second.
+SPIN_SEND_DELAY_MS = 50
+
+
+def _add_pending(func: int, cmd: int, frame: bytes, *,
+                 skip_unchanged: bool = False) -> bool:
+    key = (func, cmd)
+    _pending_frames.pop(key, None)
+    if skip_unchanged and _last_sent.get(key) == frame:
+        return False
+    _pending_frames[key] = frame
+    return True
+
+
+def queue_command(cmd: HantekCommand) -> None:
+    global _pending_idle_id
+    if not _add_pending(cmd.func, cmd.cmd, cmd.to_bytes(),
+                        skip_unchanged=True):
+        return
+    if _pending_idle_id is None:
+        _pending_idle_id = GLib.idle_add(_flush_idle)
+
+
+def queue_frame(func: int, cmd: int, frame: bytes) -> None:
+    """Queue an already encoded command frame."""
+    global _pending_idle_id
+    _add_pending(func, cmd, frame)
+    if _pending_idle_id is None:
+        _pending_idle_id = GLib.idle_add(_flush_idle)
+
+
+def defer_command(cmd: HantekCommand) -> None:
+    global _pending_timeout_id
+    if not _add_pending(cmd.func, cmd.cmd, cmd.to_bytes(),
+                        skip_unchanged=True):
+        return
+    if _pending_timeout_id is None:
+        _pending_timeout_id = GLib.timeout_add(SPIN_SEND_DELAY_MS,
+                                               _flush_timeout)
+
+
+def flush_commands() -> None:
+    # While a capture is running the device is streaming on 0x81 and must
+    # not see other frames on 0x02 before CAPTURE_RESUME; _capture_done
+    # flushes whatever was queued in the meantime.
+    if capture_thread is not None:
+        return
+    frames = list(_pending_frames.items())
+    for i in range(0, len(frames), FRAMES_PER_WRITE):
+        batch = frames[i:i + FRAMES_PER_WRITE]
+        handle.write(0x02, b"".join(frame for _, frame in batch))
+        # Only record frames as sent once the device has accepted them
+        for key, frame in batch:
+            _last_sent[key] = frame
+            del _pending_frames[key]
+
+
+def _flush_idle() -> bool:
+    global _pending_idle_id
+    _pending_idle_id = None
+    flush_commands()
+    return False
+
+
+def _flush_timeout() -> bool:
+    global _pending_timeout_id
+    _pending_timeout_id = None
+    flush_commands()
+    return False
 # ---------------------------------------------------------------------------
 # GTK widget references and callbacks
 # ---------------------------------------------------------------------------
@@ -162,6 +385,10 @@ awg_offset_spinbutton: Gtk.SpinButton
 capture_samples_spinbutton: Gtk.SpinButton
 drawing_area: Gtk.Widget
 
+# Widget -> value lookups used by the shared radio and switch handlers
+screen_map: dict[Gtk.RadioButton, int] = {}
+channel_enable_map: dict[Gtk.Switch, tuple[int, int, dict[bool, bytes]]] = {}
+
 # GLib timeout source for continuous capture
 capture_source_id: int | None = None
 
@@ -171,76 +398,44 @@ def on_window_main_destroy(widget, data):
 
 
 def on_channel_enable(switch: Gtk.Switch, state: bool, data=None):
-    idx = 0 if switch is channel_enable_switch_ch1 else 1
-    cmd = SCOPE_ENABLE_CH1 if idx == 0 else SCOPE_ENABLE_CH2
+    idx, cmd, frames = channel_enable_map[switch]
     cur_config.channel_enable[idx] = state
-    send_command(handle, HantekCommand(FUNC_SCOPE_SETTING, cmd,
-                                       [int(state), 0, 0, 0]))
+    queue_frame(FUNC_SCOPE_SETTING, cmd, frames[state])
     switch.set_state(state)
-    save_config(cur_config)
-    return True
-
-
-def on_channel_offset(widget: Gtk.SpinButton, scroll, data=None):
-    save_config(cur_config)
-
-
-def on_channel_bwlimit(switch: Gtk.Switch, state: bool, data=None):
-    switch.set_state(state)
-    save_config(cur_config)
+    schedule_save_config()
     return True
 
 
-def on_channel_coupling(widget: Gtk.ComboBox, data=None):
-    save_config(cur_config)
-
-
-def on_channel_scale(widget: Gtk.ComboBox, data=None):
-    save_config(cur_config)
-
-
-def on_channel_probe(widget: Gtk.ComboBox, data=None):
-    save_config(cur_config)
-
-
 def on_time_scale(widget: Gtk.ComboBox, data=None):
     val = widget.get_active()
     cur_config.time_scale = val
-    send_command(handle, HantekCommand(FUNC_SCOPE_SETTING, SCOPE_SCALE_TIME,
-                                       [val, 0, 0, 0]))
-    save_config(cur_config)
+    queue_command(HantekCommand(FUNC_SCOPE_SETTING, SCOPE_SCALE_TIME,
+                                (val, 0, 0, 0)))
+    schedule_save_config()
 
 
 def on_time_offset(widget: Gtk.SpinButton, scroll, data=None):
     val = widget.get_value()
     cur_config.time_offset = val
-    send_command(handle, HantekCommand(FUNC_SCOPE_SETTING, SCOPE_OFFSET_TIME,
-                                       [int(val), 0, 0, 0]))
-    save_config(cur_config)
+    defer_command(HantekCommand(FUNC_SCOPE_SETTING, SCOPE_OFFSET_TIME,
+                                (int(val), 0, 0, 0)))
+    schedule_save_config()
 
 
 def on_trigger_source(widget: Gtk.ComboBox, data=None):
     val = widget.get_active()
     cur_config.trigger_source = val
-    send_command(handle, HantekCommand(FUNC_SCOPE_SETTING, SCOPE_TRIGGER_SOURCE,
-                                       [val, 0, 0, 0]))
-    save_config(cur_config)
-
-
-def on_trigger_slope(widget: Gtk.ComboBox, data=None):
-    return
-
-
-def on_trigger_mode(widget: Gtk.ComboBox, data=None):
-    return
+    queue_command(HantekCommand(FUNC_SCOPE_SETTING, SCOPE_TRIGGER_SOURCE,
+                                (val, 0, 0, 0)))
+    schedule_save_config()
 
 
 def on_trigger_level(widget: Gtk.SpinButton, scroll, data=None):
     val = widget.get_value()
     cur_config.trigger_level = val
-    send_command(handle, HantekCommand(FUNC_SCOPE_SETTING, SCOPE_TRIGGER_LEVEL,
-                                       [int(val), 0, 0, 0]))
-    save_config(cur_config)
+    defer_command(HantekCommand(FUNC_SCOPE_SETTING, SCOPE_TRIGGER_LEVEL,
+                                (int(val), 0, 0, 0)))
+    schedule_save_config()
 
 
 def on_start(widget, data=None):
@@ -266,84 +461,107 @@ def on_awg_freq(widget: Gtk.SpinButton, scroll, data=None):
     val = int(widget.get_value())
     cur_config.awg_frequency = val
     cmd = HantekCommand(FUNC_AWG_SETTING, AWG_FREQ)
-    cmd.vals = list(struct.pack('<I', val))
-    send_command(handle, cmd)
-    save_config(cur_config)
+    cmd.vals = struct.pack('<I', val)
+    defer_command(cmd)
+    schedule_save_config()
 
 
 def on_awg_amp(widget: Gtk.SpinButton, scroll, data=None):
     val = widget.get_value()
     cur_config.awg_amplitude = val
-    vals = [abs(int(val*1000)), int(val < 0), 0, 0]
-    send_command(handle, HantekCommand(FUNC_AWG_SETTING, AWG_AMP, vals))
-    save_config(cur_config)
+    vals = (abs(int(val*1000)), int(val < 0), 0, 0)
+    defer_command(HantekCommand(FUNC_AWG_SETTING, AWG_AMP, vals))
+    schedule_save_config()
 
 
 def on_awg_offset(widget: Gtk.SpinButton, scroll, data=None):
     val = widget.get_value()
     cur_config.awg_offset = val
-    vals = [abs(int(val*1000)), int(val < 0), 0, 0]
-    send_command(handle, HantekCommand(FUNC_AWG_SETTING, AWG_OFF, vals))
-    save_config(cur_config)
-
-
-def on_awg_type(widget: Gtk.ComboBox, data=None):
-    return
-
-
-def on_awg_square_duty(widget: Gtk.SpinButton, scroll, data=None):
-    return
-
-
-def on_awg_ramp_duty(widget: Gtk.SpinButton, scroll, data=None):
-    return
-
-
-def on_awg_trap_duty(widget: Gtk.SpinButton, scroll, data=None):
-    return
+    vals = (abs(int(val*1000)), int(val < 0), 0, 0)
+    defer_command(HantekCommand(FUNC_AWG_SETTING, AWG_OFF, vals))
+    schedule_save_config()
 
 
 def on_awg_start(widget, data=None):
-    send_command(handle, HantekCommand(FUNC_AWG_SETTING, AWG_START,
-                                       [1, 0, 0, 0]))
+    queue_frame(FUNC_AWG_SETTING, AWG_START, AWG_START_ON)
 
 
 def on_awg_stop(widget, data=None):
-    send_command(handle, HantekCommand(FUNC_AWG_SETTING, AWG_START,
-                                       [0, 0, 0, 0]))
+    queue_frame(FUNC_AWG_SETTING, AWG_START, AWG_START_OFF)
 
 
 def on_radio(button: Gtk.RadioButton, data=None):
-    if button is scope_radio:
-        val = SCREEN_VAL_SCOPE
-    elif button is awg_radio:
-        val = SCREEN_VAL_AWG
-    else:
-        val = SCREEN_VAL_DMM
-    send_command(handle, HantekCommand(FUNC_SCREEN_SETTING, 0, [val, 0, 0, 0]))
+    queue_frame(FUNC_SCREEN_SETTING, 0, SCREEN_SETTING[screen_map[button]])
 
 
-capture_buffer = bytearray(6000)
+# Captures are double buffered: USB data is read into the back buffer and
+# only swapped to the front (drawn) buffer once a frame is complete, so the
+# display never shows a partially received or aborted capture.  They are
+# array.array objects so PyUSB can read into them in place.
+capture_buffer = array.array("B", bytes(6000))
+capture_back_buffer = array.array("B", bytes(6000))
+# Per-channel sample views of the last complete frame (None if disabled)
+capture_channels: list[np.ndarray | None] = [None, None]
 
 
-def capture_waveform() -> None:
-    """Request a capture from the oscilloscope and refresh the drawing."""
-    num_channels = int(cur_config.channel_enable[0]) + int(cur_config.channel_enable[1])
-    total_samples = cur_config.num_samples * num_channels
+# Background thread reading the current capture, if any
+capture_thread: threading.Thread | None = None
 
-    ch1_samples = cur_config.num_samples if cur_config.channel_enable[0] else 0
-    ch2_samples = cur_config.num_samples if cur_config.channel_enable[1] else 0
+
+def capture_waveform() -> None:
+    """Request a capture from the oscilloscope and refresh the drawing.
+
+    The USB transfer runs on a background thread so the GTK main loop keeps
+    handling input and redraws; a request made while a capture is still in
+    progress is ignored.
+    """
+    global capture_thread, capture_back_buffer
+    if capture_thread is not None:
+        return
+    num_samples = cur_config.num_samples
+    en0, en1 = cur_config.channel_enable
+    total_samples = num_samples * (int(en0) + int(en1))
+
+    # PyUSB reads into an array for its whole length, so the back buffer is
+    # kept exactly as large as the capture and only reallocated on resize.
+    if len(capture_back_buffer) != total_samples:
+        capture_back_buffer = array.array("B", bytes(total_samples))
+
+    # Apply any queued settings before starting the capture
+    flush_commands()
+    capture_thread = threading.Thread(target=_capture_thread_main,
+                                      args=(num_samples, en0, en1),
+                                      daemon=True)
+    capture_thread.start()
+
+
+def _capture_thread_main(num_samples: int, en0: bool, en1: bool) -> None:
+    # Only fills capture_back_buffer; the buffer swap happens on the main
+    # loop in _capture_done once this thread has finished.
+    total_samples = len(capture_back_buffer)
+    ch1_samples = num_samples if en0 else 0
+    ch2_samples = num_samples if en1 else 0
     cmd = HantekCommand(FUNC_SCOPE_CAPTURE, SCOPE_START_RECV)
-    cmd.vals = list(struct.pack('<HH', ch1_samples, ch2_samples))
-    send_command(handle, cmd)
+    cmd.vals = struct.pack('<HH', ch1_samples, ch2_samples)
 
+    complete = False
     count = 0
     try:
+        send_command(handle, cmd)
+        if total_samples:
+            # Ask for the whole capture in one call and let libusb split
+            # the request into packets; allow roughly 1 ms per packet on
+            # top of the base timeout.
+            count = handle.read(0x81, capture_back_buffer,
+                                timeout=CAPTURE_TIMEOUT_MS + total_samples // 64)
         while count < total_samples:
-            length = min(total_samples - count, 64)
-            data_read = handle.read(0x81, length, timeout=2000)
-            capture_buffer[count:count + len(data_read)] = data_read
+            # The device delivered a short transfer; fetch the remainder
+            length = min(total_samples - count, CAPTURE_CHUNK)
+            data_read = handle.read(0x81, length,
+                                    timeout=CAPTURE_TIMEOUT_MS + length // 64)
+            capture_back_buffer[count:count + len(data_read)] = data_read
             count += len(data_read)
+        complete = True
     except usb.core.USBTimeoutError:
         # If the device fails to deliver the expected amount of data
         # within the timeout, abort this capture but keep the
@@ -351,35 +569,62 @@ def capture_waveform() -> None:
         # halt the UI and leave the oscilloscope in a frozen state.
         print("USB read timed out; capture aborted")
     finally:
-        drawing_area.queue_draw()
-
-        # Resume regular scope operation so the device's own screen
-        # continues updating after each USB capture. Without this
-        # additional command the oscilloscope halts its display when the
-        # PC requests a waveform, appearing to "freeze" once Start is
-        # pressed in the application. Sending an empty capture request
-        # re-enables the live display on the instrument.
-        send_command(handle, HantekCommand(FUNC_SCOPE_CAPTURE,
-                                           SCOPE_START_RECV,
-                                           [0, 0, 0, 0]))
+        try:
+            # Resume regular scope operation so the device's own screen
+            # continues updating after each USB capture. Without this
+            # additional command the oscilloscope halts its display when the
+            # PC requests a waveform, appearing to "freeze" once Start is
+            # pressed in the application. Sending an empty capture request
+            # re-enables the live display on the instrument.
+            handle.write(0x02, CAPTURE_RESUME)
+        finally:
+            GLib.idle_add(_capture_done, complete, en0, en1)
+
+
+def _capture_done(complete: bool, en0: bool, en1: bool) -> bool:
+    global capture_thread, capture_buffer, capture_back_buffer
+    capture_thread.join()
+    capture_thread = None
+    flush_commands()
+    if complete:
+        capture_buffer, capture_back_buffer = capture_back_buffer, capture_buffer
+        # Split the interleaved frame into per-channel column views once,
+        # so drawing needs no index arithmetic.
+        channels = [None, None]
+        num_channels = int(en0) + int(en1)
+        if num_channels:
+            frame = np.frombuffer(capture_buffer, dtype=np.uint8).reshape(
+                -1, num_channels)
+            columns = iter(frame.T)
+            channels = [next(columns) if en else None for en in (en0, en1)]
+        capture_channels[:] = channels
+    drawing_area.queue_draw()
+    return False
 
 
 def on_capture_button_clicked(widget, data=None):
     capture_waveform()
 
 
-def draw_callback(widget, cr, data=None):
-    width = widget.get_allocated_width()
-    height = widget.get_allocated_height()
-    num_channels = int(cur_config.channel_enable[0]) + int(cur_config.channel_enable[1])
-    num_samples = cur_config.num_samples * num_channels
+# Off-screen ARGB32 pixel buffer the traces are drawn into, recreated
+# whenever the drawing area changes size.
+TRACE_COLORS = (0xFFFFFF00, 0xFF00FF00)  # CH1 yellow, CH2 green
+trace_pixels: np.ndarray | None = None
+trace_surface: cairo.ImageSurface | None = None
 
-    cr.set_source_rgb(0, 0, 0)
-    cr.paint()
-    cr.set_source_rgb(0.9, 0.9, 0.9)
-    cr.set_dash([5.0, 5.0], 0)
-    cr.set_line_width(0.3)
-    num_sector = cur_config.num_samples // 100
+
+# Grid path of the last redraw and the (width, height, num_samples) it
+# was built for; it only changes on resize or a new sample count.
+_grid_cache: tuple[tuple[int, int, int], cairo.Path] | None = None
+
+
+def _grid_path(width: int, height: int, num_samples: int) -> cairo.Path:
+    global _grid_cache
+    key = (width, height, num_samples)
+    if _grid_cache is not None and _grid_cache[0] == key:
+        return _grid_cache[1]
+    cr = cairo.Context(cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None))
+    num_sector = num_samples // 100
     for i in range(1, num_sector):
         x = i * width / num_sector
         cr.move_to(x, 0)
@@ -388,31 +633,119 @@ def draw_callback(widget, cr, data=None):
         y = i * height / 8
         cr.move_to(0, y)
         cr.line_to(width, y)
+    path = cr.copy_path()
+    _grid_cache = (key, path)
+    return path
+
+
+def draw_callback(widget, cr, data=None):
+    width = widget.get_allocated_width()
+    height = widget.get_allocated_height()
+    en0, en1 = cur_config.channel_enable
+
+    # Loop invariants: raw samples span 29..231 from bottom to top
+    y_off = 29.0
+    y_scale = height / 202.0
+
+    cr.set_source_rgb(0, 0, 0)
+    cr.paint()
+    cr.set_source_rgb(0.9, 0.9, 0.9)
+    cr.set_dash([5.0, 5.0], 0)
+    cr.set_line_width(0.3)
+    cr.append_path(_grid_path(width, height, cur_config.num_samples))
     cr.stroke()
 
-    cr.set_dash([], 0)
-    cr.set_line_width(0.5)
-    for ch in range(2):
-        if not cur_config.channel_enable[ch]:
+    if trace_surface is None or trace_surface.get_width() != width \
+            or trace_surface.get_height() != height:
+        return False
+
+    # Rasterize the traces straight into the off-screen pixel buffer and
+    # blit it over the grid in one paint.
+    pixels = trace_pixels[:, :width]
+    pixels.fill(0)
+    rows = np.arange(height)[:, None]
+    for samples, enabled, color in zip(capture_channels, (en0, en1),
+                                       TRACE_COLORS):
+        if samples is None or not enabled:
             continue
-        if ch == 0:
-            cr.set_source_rgb(1, 1, 0)
-        else:
-            cr.set_source_rgb(0, 1, 0)
-        start = capture_buffer[ch]
-        cr.move_to(0, height - (start - 29) * height / 202)
-        for x in range(1, cur_config.num_samples):
-            idx = x * num_channels + ch
-            val = capture_buffer[idx]
-            cr.line_to(x * width / cur_config.num_samples,
-                       height - (val - 29) * height / 202)
-        cr.stroke()
+        ys = height - (samples - y_off) * y_scale
+        top, bottom = _trace_spans(ys, width / len(samples), width, height)
+        pixels[(rows >= top) & (rows <= bottom)] = color
+    trace_surface.mark_dirty()
+    cr.set_source_surface(trace_surface, 0, 0)
+    cr.paint()
     return False
 
 
+def _trace_spans(ys: np.ndarray, x_scale: float, width: int,
+                 height: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the top and bottom pixel row covered by a trace per column."""
+    ys = np.clip(ys, 0, height - 1)
+    top, bottom = _column_spans(ys, x_scale, width)
+    return np.rint(top).astype(np.intp), np.rint(bottom).astype(np.intp)
+
+
+def _column_spans_numpy(ys, x_scale, width):
+    xs = np.arange(len(ys)) * x_scale
+    col_y = np.interp(np.arange(width), xs, ys)
+    top = col_y.copy()
+    bottom = col_y.copy()
+    # Join each column to its left neighbour so steep edges stay connected
+    np.minimum(top[1:], col_y[:-1], out=top[1:])
+    np.maximum(bottom[1:], col_y[:-1], out=bottom[1:])
+    # Keep the peaks of several samples falling into the same column
+    cols = np.minimum(xs.astype(np.intp), width - 1)
+    np.minimum.at(top, cols, ys)
+    np.maximum.at(bottom, cols, ys)
+    return top, bottom
+
+
+def _column_spans_loop(ys, x_scale, width):
+    # Same result as _column_spans_numpy written as plain loops, which Numba
+    # compiles into a single pass without temporaries.
+    n = ys.shape[0]
+    top = np.empty(width)
+    bottom = np.empty(width)
+    j = 0
+    prev = ys[0]
+    for c in range(width):
+        while j < n - 1 and (j + 1) * x_scale <= c:
+            j += 1
+        if j == n - 1:
+            y = ys[j]
+        else:
+            y = ys[j] + (ys[j + 1] - ys[j]) * ((c - j * x_scale) / x_scale)
+        top[c] = min(y, prev) if c else y
+        bottom[c] = max(y, prev) if c else y
+        prev = y
+    for i in range(n):
+        c = min(int(i * x_scale), width - 1)
+        top[c] = min(top[c], ys[i])
+        bottom[c] = max(bottom[c], ys[i])
+    return top, bottom
+
+
+if njit is not None:
+    _column_spans = njit(cache=True, fastmath=True)(_column_spans_loop)
+else:
+    _column_spans = _column_spans_numpy
+
+
+def on_drawing_area_size_allocate(widget, allocation, data=None):
+    global trace_pixels, trace_surface
+    width, height = allocation.width, allocation.height
+    if trace_surface is not None and (trace_surface.get_width(),
+                                      trace_surface.get_height()) == (width, height):
+        return
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+    trace_pixels = np.zeros((height, stride // 4), dtype=np.uint32)
+    trace_surface = cairo.ImageSurface.create_for_data(
+        trace_pixels, cairo.FORMAT_ARGB32, width, height, stride)
+
+
 def on_capture_samples(widget: Gtk.SpinButton, scroll, data=None):
     cur_config.num_samples = widget.get_value_as_int()
-    save_config(cur_config)
+    schedule_save_config()
 # ---------------------------------------------------------------------------
 # GUI setup and application entry point
 # ---------------------------------------------------------------------------
@@ -440,27 +773,26 @@ def setup_gui(builder: Gtk.Builder) -> None:
     capture_samples_spinbutton = builder.get_object("capture_samples_spinbutton")
     drawing_area = builder.get_object("drawing_area")
 
+    screen_map.update({
+        scope_radio: SCREEN_VAL_SCOPE,
+        awg_radio: SCREEN_VAL_AWG,
+        dmm_radio: SCREEN_VAL_DMM,
+    })
+    channel_enable_map.update({
+        channel_enable_switch_ch1: (0, SCOPE_ENABLE_CH1, CH1_ENABLE),
+        channel_enable_switch_ch2: (1, SCOPE_ENABLE_CH2, CH2_ENABLE),
+    })
+
 
 handlers = {
     "on_window_main_destroy": on_window_main_destroy,
     "on_channel_enable": on_channel_enable,
-    "on_channel_offset": on_channel_offset,
-    "on_channel_bwlimit": on_channel_bwlimit,
-    "on_channel_coupling": on_channel_coupling,
-    "on_channel_scale": on_channel_scale,
-    "on_channel_probe": on_channel_probe,
     "on_time_scale": on_time_scale,
     "on_time_offset": on_time_offset,
     "on_trigger_source": on_trigger_source,
-    "on_trigger_slope": on_trigger_slope,
-    "on_trigger_mode": on_trigger_mode,
     "on_trigger_level": on_trigger_level,
     "on_start": on_start,
     "on_stop": on_stop,
-    "on_awg_type": on_awg_type,
-    "on_awg_square_duty": on_awg_square_duty,
-    "on_awg_ramp_duty": on_awg_ramp_duty,
-    "on_awg_trap_duty": on_awg_trap_duty,
     "on_awg_freq": on_awg_freq,
     "on_awg_amp": on_awg_amp,
     "on_awg_offset": on_awg_offset,
@@ -469,12 +801,13 @@ handlers = {
     "on_radio": on_radio,
     "on_capture_button_clicked": on_capture_button_clicked,
     "draw_callback": draw_callback,
+    "on_drawing_area_size_allocate": on_drawing_area_size_allocate,
     "on_capture_samples": on_capture_samples,
 }
 
 
 def main() -> None:
-    global handle, cur_config
+    global handle, cur_config, capture_thread
     handle = find_device(VENDOR, PRODUCT)
     claim_interfaces(handle)
 
@@ -489,6 +822,10 @@ def main() -> None:
     window.show_all()
     Gtk.main()
 
+    if capture_thread is not None:
+        capture_thread.join()
+        capture_thread = None
+    flush_commands()
     save_config(cur_config)
     release_interfaces(handle)
 